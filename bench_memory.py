@@ -0,0 +1,97 @@
+"""Memory/time benchmark: the old plain-dict store vs the compact StoreFile the app uses.
+
+Builds a synthetic store (default 100k messages) in a temporary participants_store.json
+and compares, for load and for save:
+
+- dict layout: json.loads of the whole file on every call, and json.dumps(indent=2) of
+  the dicts on every write (the original load_store/save_store);
+- compact layout: StoreFile.load() and StoreFile.save(). A reload is what every other
+  process pays after each foreign write; a cached load is every other call.
+
+Resident and peak memory come from tracemalloc; times are wall-clock means.
+
+    python bench_memory.py [n_messages]
+"""
+import gc, json, random, sys, tempfile, time, tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from cynosure_records import StoreFile, norm
+
+def synthetic_store(n_messages, n_events=40, per_event=60, seed=7):
+    rnd = random.Random(seed)
+    events = [f"Event {i} (Category {i % 5})" for i in range(n_events)]
+    people = [(ev, f"Participant {e}-{j}") for e, ev in enumerate(events) for j in range(per_event)]
+    participants = [{"event": ev, "event_key": norm(ev), "name": name, "name_key": norm(name),
+                     "phone": f"98{rnd.randrange(10**8):08d}", "email": "", "grade": str(rnd.randint(6, 12)),
+                     "division": rnd.choice("ABCD"), "subcat": rnd.choice(["", "Category I : 6th to 8th"])}
+                    for ev, name in people]
+    admins = ["Admin One", "Admin Two", "Admin Three"]
+    t0 = datetime(2025, 9, 26, 8, 0)
+    messages = []
+    for i in range(n_messages):
+        ev, name = rnd.choice(people)
+        inbound = rnd.random() < 0.6
+        frm, to = (name, "Admins") if inbound else (rnd.choice(admins), name)
+        kind = "call_request" if inbound and rnd.random() < 0.05 else "chat"
+        messages.append({"to": to, "to_key": norm(to), "from": frm, "from_key": norm(frm),
+                         "event": ev, "event_key": norm(ev), "to_role": "admin" if inbound else "participant",
+                         "text": f"message {i}", "timestamp": (t0 + timedelta(seconds=i)).isoformat(),
+                         "kind": kind, "meta": {"direction": "Both"} if kind == "call_request" else {}, "seq": i + 1})
+    sessions = [{"name": name, "name_key": norm(name), "role": "participant", "last_seen": t0.isoformat(), "phone": ""}
+                for _, name in people]
+    return {"participants": participants, "messages": messages, "sessions": sessions}
+
+def measure(fn):
+    """(result, resident bytes, peak bytes) for one call, as tracked by tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    out = fn()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, current, peak
+
+def timed(fn, repeat):
+    t = time.perf_counter()
+    for _ in range(repeat): fn()
+    return (time.perf_counter() - t) / repeat
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "participants_store.json"
+        path.write_text(json.dumps(synthetic_store(n), ensure_ascii=False, indent=2), encoding="utf-8")
+
+        dict_load = lambda: json.loads(path.read_text(encoding="utf-8"))
+        store, dict_res, dict_load_peak = measure(dict_load)
+        counts = ", ".join(f"{len(store[k])} {k}" for k in ("participants", "messages", "sessions"))
+        dict_load_t = timed(dict_load, 3)
+        dict_save = lambda: path.write_text(json.dumps(store, ensure_ascii=False, indent=2), encoding="utf-8")
+        _, _, dict_save_peak = measure(dict_save)
+        dict_save_t = timed(dict_save, 3)
+        del store
+
+        first = StoreFile(path, {})
+        store, comp_res, comp_load_peak = measure(first.load)
+        cached_t = timed(first.load, 1000)
+        _, _, comp_save_peak = measure(lambda: first.save(store))
+        save_t = timed(lambda: first.save(store), 3)
+        assert first.load() is store
+        # Reload the file as StoreFile.save() left it, i.e. after a foreign write; names are
+        # already interned, as in a live process.
+        reload_t = timed(lambda: StoreFile(path, {}).load(), 3)
+        _, _, comp_reload_peak = measure(lambda: StoreFile(path, {}).load())
+
+    mb = lambda b: f"{b / 2**20:7.1f} MiB"
+    ms = lambda s: f"{s * 1000:9.1f} ms"
+    print(f"Store: {counts}")
+    print(f"resident      dict {mb(dict_res)}   compact {mb(comp_res)}   ({100 * (1 - comp_res / dict_res):.0f}% less)")
+    print(f"load          dict {ms(dict_load_t)} every call,  peak {mb(dict_load_peak)}")
+    print(f"              compact reload {ms(reload_t)} after each foreign write,  peak {mb(comp_reload_peak)}"
+          f"  (first load peak {mb(comp_load_peak)})")
+    print(f"              compact cached {cached_t * 1e6:9.1f} µs otherwise")
+    print(f"save          dict {ms(dict_save_t)},  peak {mb(dict_save_peak)} above resident")
+    print(f"              compact {ms(save_t)},  peak {mb(comp_save_peak)} above resident")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
-import json, re
+import functools, json, re, threading
+from bisect import bisect_right
 from datetime import datetime, timedelta
 from pathlib import Path
 import streamlit as st
 import pandas as pd
 import streamlit.components.v1 as components
+from cynosure_records import NAMES, Participant, Message, Session, StoreFile, norm, dump_records, write_json_atomic
 
 APP_TITLE = "Cynosure 2025 — Secure Event Portal (v3)"
 
@@ -26,12 +28,6 @@ def get_query_params():
         except Exception:
             return {}
 
-def norm(s: str) -> str:
-    if not s: return ""
-    s = s.strip().lower()
-    s = re.sub(r"\s+", " ", s)
-    return s
-
 def ekey(name: str) -> str: return norm(name)
 def nkey(name: str) -> str: return norm(name)
 
@@ -43,54 +39,152 @@ EVENTS = json.loads(DATA_PATH.read_text(encoding="utf-8")).get("events", [])
 EVENTS_BY_KEY = {ekey(ev.get("name","")): ev for ev in EVENTS}
 
 STORE_PATH = Path(__file__).with_name("participants_store.json")
+CURSORS_PATH = Path(__file__).with_name("read_cursors.json")  # per-admin read cursors, kept out of the store
+THREADS_VERSION = 2  # bump when the layout of store["threads"] changes
 DEFAULT_STORE = {
     "participants": [], "messages": [], "completions": [], "sessions": [], "updated_at": "",
-    "categories": {}, "drafts": {}  # drafts[event_key][category] = last form values
+    "categories": {}, "drafts": {},  # drafts[event_key][category] = last form values
+    "seq": 0, "threads": {}, "threads_version": THREADS_VERSION  # see thread index helpers below
 }
 
-def load_store():
-    if not STORE_PATH.exists():
-        STORE_PATH.write_text(json.dumps(DEFAULT_STORE, ensure_ascii=False), encoding="utf-8")
-    try:
-        store = json.loads(STORE_PATH.read_text(encoding="utf-8"))
-    except Exception:
-        store = dict(DEFAULT_STORE)
-    changed = False
+def _prepare_store(store):
+    """Runs once per (re)read of the file; records are already normalized when written."""
     store.setdefault("categories", {})
     store.setdefault("drafts", {})
-    for p in store.get("participants", []):
-        p.setdefault("name",""); p.setdefault("phone",""); p.setdefault("email","")
-        p.setdefault("grade",""); p.setdefault("division",""); p.setdefault("subcat","")
-        if "name_key" not in p: p["name_key"] = nkey(p.get("name","")); changed = True
-        if "event_key" not in p: p["event_key"] = ekey(p.get("event","")); changed = True
-    for m in store.get("messages", []):
-        m.setdefault("to_key", nkey(m.get("to",""))); m.setdefault("from_key", nkey(m.get("from",""))); m.setdefault("event_key", ekey(m.get("event","")))
-        m.setdefault("kind","chat"); m.setdefault("meta",{})
-    if changed: save_store(store)
-    return store
-
-def save_store(store):
-    store["updated_at"] = datetime.now().isoformat()
-    STORE_PATH.write_text(json.dumps(store, ensure_ascii=False, indent=2), encoding="utf-8")
+    rewrite = False
+    legacy_cursors = store.pop("read_cursors", None)
+    if legacy_cursors is not None:
+        if legacy_cursors and not CURSORS_PATH.exists():
+            write_json_atomic(CURSORS_PATH, [json.dumps(legacy_cursors, ensure_ascii=False)])
+        rewrite = True
+    if store.get("threads_version")!=THREADS_VERSION or "seq" not in store:
+        rebuild_thread_index(store); rewrite = True
+    return rewrite
+
+@st.cache_resource
+def _store_file():
+    """One compact store per process, shared by all sessions; re-read only when the file changes."""
+    return StoreFile(STORE_PATH, DEFAULT_STORE, _prepare_store)
+
+def load_store(): return _store_file().load()
+def save_store(store): _store_file().save(store)
+
+def _store_txn(fn):
+    """Runs a load-modify-save helper as one store transaction (see StoreFile.transaction)."""
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        with _store_file().transaction():
+            return fn(*args, **kwargs)
+    return run
+
+# ---------- Thread index, read cursors & admin inbox ----------
+# Every message carries a store-wide "seq" and store["messages"] is kept in seq order.
+# store["threads"][thread_key] indexes the seqs participants sent to admins in each
+# (event, participant) thread, and read_cursors.json maps admin_key -> thread_key -> the last
+# seq that admin was shown, so unread counts never scan the message history. Cursors live in
+# their own small file so marking a thread read never rewrites (or invalidates) the store.
+def thread_key(ev_key, participant_nkey): return f"{ev_key}|{participant_nkey}"
+
+def _index_message(store, m):
+    """Adds one message (already numbered) to its thread in the index."""
+    to_admin = m.to_role=="admin"
+    pid = m.from_id if to_admin else m.to_id
+    pk = NAMES.key(pid)
+    th = store.setdefault("threads", {}).setdefault(thread_key(m.event_key, pk), {
+        "event": m.event, "event_key": m.event_key,
+        "participant": NAMES.text(pid), "participant_key": pk,
+        "to_admin": [], "open_calls": [], "last_seq": 0})
+    if to_admin:
+        th["to_admin"].append(m.seq)
+    if m.kind=="call_request":
+        th["open_calls"].append(m.seq)
+    elif m.kind=="system":  # "Mark call fulfilled"
+        th["open_calls"] = []
+    th["last_seq"] = m.seq
+
+def rebuild_thread_index(store):
+    """Numbers legacy messages by timestamp and rebuilds store["threads"] from scratch."""
+    msgs = store.get("messages", [])
+    if any(not m.seq for m in msgs):
+        for i, m in enumerate(sorted(msgs, key=lambda m: m.timestamp), start=1): m.seq = i
+    msgs.sort(key=lambda m: m.seq)
+    store["seq"] = msgs[-1].seq if msgs else 0
+    store["threads"] = {}; store["threads_version"] = THREADS_VERSION
+    for m in msgs:
+        _index_message(store, m)
+
+def message_by_seq(store, seq):
+    """Messages are appended in seq order, so seq n normally sits at index n-1."""
+    msgs = store["messages"]
+    if 0 < seq <= len(msgs) and msgs[seq-1].seq==seq: return msgs[seq-1]
+    return next((m for m in msgs if m.seq==seq), None)
+
+def _read_cursor_file():
+    try:
+        return json.loads(CURSORS_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+@st.cache_resource
+def _cursor_lock(): return threading.Lock()
+
+def load_cursors(admin_name):
+    """This admin's read cursors, {thread_key: seq}."""
+    return _read_cursor_file().get(nkey(admin_name), {})
+
+def mark_thread_read(admin_name, ev_key, participant_nkey, seq):
+    """Advances this admin's cursor up to `seq`, the last message actually shown to them."""
+    tk = thread_key(ev_key, participant_nkey)
+    with _cursor_lock():
+        data = _read_cursor_file()
+        cur = data.setdefault(nkey(admin_name), {})
+        if cur.get(tk, 0) >= seq: return
+        cur[tk] = seq
+        write_json_atomic(CURSORS_PATH, [json.dumps(data, ensure_ascii=False)])
+
+def unread_count(store, cursors, ev_key, participant_nkey):
+    """Participant messages in one thread past this admin's cursor."""
+    tk = thread_key(ev_key, participant_nkey)
+    th = store["threads"].get(tk)
+    if not th: return 0
+    return len(th["to_admin"]) - bisect_right(th["to_admin"], cursors.get(tk, 0))
+
+def admin_inbox(store, cursors, ev_key=None):
+    """Threads with unread participant messages or open call requests for this admin, oldest waiting first."""
+    rows = []
+    for tk, th in list(store["threads"].items()):
+        if ev_key and th["event_key"]!=ev_key: continue
+        i = bisect_right(th["to_admin"], cursors.get(tk, 0))
+        unread = len(th["to_admin"]) - i
+        if not unread and not th["open_calls"]: continue
+        first = message_by_seq(store, min(th["to_admin"][i:i+1] + th["open_calls"][:1]))
+        last = message_by_seq(store, th["last_seq"])
+        rows.append({"thread": tk, "event": th["event"], "event_key": th["event_key"],
+                     "participant": th["participant"], "participant_key": th["participant_key"],
+                     "unread": unread, "open_calls": len(th["open_calls"]), "last_seq": th["last_seq"],
+                     "waiting_since": first.timestamp if first else "",
+                     "last": f"{last.from_}: {last.text[:60]}" if last else ""})
+    rows.sort(key=lambda r: r["waiting_since"])
+    return rows
 
+@_store_txn
 def upsert_session(name: str, role: str, phone: str = ""):
     s = load_store()
     now = datetime.now().isoformat()
-    nk = nkey(name)
+    nid = NAMES.intern(name)
     for row in s.get("sessions", []):
-        if row.get("name_key")==nk:
-            row["name"] = name; row["role"] = role; row["last_seen"] = now; row["phone"] = phone.strip()
+        if row.name_kid==NAMES.key_id(nid):
+            row.name_id = nid; row.role = role; row.last_seen = now; row.phone = phone.strip()
             save_store(s); return
-    s.setdefault("sessions", []).append({"name": name, "name_key": nk, "role": role, "last_seen": now, "phone": phone.strip()})
+    s.setdefault("sessions", []).append(Session(name, role, now, phone.strip()))
     save_store(s)
 
 # Optional seed
+@_store_txn
 def maybe_seed():
     s = load_store()
     if not s["participants"] and EVENTS:
-        demo = {"event": EVENTS[0].get("name","(Unnamed)"), "event_key": ekey(EVENTS[0].get("name","")), "name": "Demo User",
-                "name_key": nkey("Demo User"), "phone":"", "email":"", "grade":"", "division":"", "subcat":""}
-        s["participants"].append(demo); save_store(s)
+        s["participants"].append(Participant(EVENTS[0].get("name","(Unnamed)"), "Demo User")); save_store(s)
 maybe_seed()
 
 # ---------- Time helpers ----------
@@ -153,54 +247,60 @@ def status_badge(sdt, edt):
     return "🔴 On-going"
 
 # ---------- Messaging & store helpers ----------
+@_store_txn
 def send_message(to_name, from_name, ev_name, text, to_role, kind="chat", meta=None):
     if not text.strip() and kind=="chat": return
     s = load_store()
-    s["messages"].append({
-        "to": to_name, "to_key": nkey(to_name),
-        "from": from_name, "from_key": nkey(from_name),
-        "event": ev_name, "event_key": ekey(ev_name),
-        "to_role": to_role,
-        "text": text.strip(),
-        "timestamp": datetime.now().isoformat(),
-        "kind": kind,
-        "meta": meta or {}
-    })
+    s["seq"] = s.get("seq", 0) + 1
+    m = Message(to_name, from_name, ev_name, to_role, text.strip(), datetime.now().isoformat(), kind, meta, s["seq"])
+    s["messages"].append(m)
+    _index_message(s, m)
     save_store(s)
 
 def event_participants(ev_name, subcat=None):
     s = load_store()
-    evk = ekey(ev_name)
-    rows = [p for p in s["participants"] if p.get("event_key")==evk]
+    evk = NAMES.lookup_key(ekey(ev_name))
+    rows = [p for p in s["participants"] if p.event_kid==evk]
     if subcat and subcat!="All":
-        rows = [p for p in rows if (p.get("subcat") or "")==subcat]
-    rows.sort(key=lambda p: (p.get("subcat") or "", p.get("name","").lower()))
+        rows = [p for p in rows if p.subcat==subcat]
+    rows.sort(key=lambda p: (p.subcat, p.name.lower()))
     return rows
 
+@_store_txn
 def upsert_participant(ev_name, name, phone, email, grade, division, subcat):
     s = load_store()
-    evk, nk = ekey(ev_name), nkey(name)
-    sc = subcat or ""
-    for p in s["participants"]:
-        if p["event_key"]==evk and p["name_key"]==nk and (p.get("subcat") or "")==sc:
-            p.update({"name":name.strip(),"phone":phone.strip(),"email":email.strip(),"grade":grade.strip(),"division":division.strip(),"subcat":sc})
+    new = Participant(ev_name, name.strip(), phone.strip(), email.strip(), grade.strip(), division.strip(), subcat or "")
+    for i, p in enumerate(s["participants"]):
+        if p.event_kid==new.event_kid and p.name_kid==new.name_kid and p.subcat==new.subcat:
+            new.event_id = p.event_id
+            s["participants"][i] = new
             save_store(s); return
-    s["participants"].append({"event": ev_name, "event_key": evk, "name": name.strip(), "name_key": nk,
-                              "phone": phone.strip(), "email": email.strip(), "grade": grade.strip(),
-                              "division": division.strip(), "subcat": sc})
+    s["participants"].append(new)
     save_store(s)
 
+@_store_txn
 def remove_participant(ev_name, name, subcat_display):
     s = load_store()
-    evk, nk = ekey(ev_name), nkey(name)
+    evk, nk = NAMES.lookup_key(ekey(ev_name)), NAMES.lookup_key(nkey(name))
     sc = subcat_display or ""
-    s["participants"] = [p for p in s["participants"] if not (p["event_key"]==evk and p["name_key"]==nk and (p.get("subcat") or "")==sc)]
+    s["participants"] = [p for p in s["participants"] if not (p.event_kid==evk and p.name_kid==nk and p.subcat==sc)]
     save_store(s)
 
-def get_thread(ev_key, participant_nkey):
-    msgs = load_store()["messages"]
-    th = [m for m in msgs if m.get("event_key")==ev_key and (m.get("to_key")==participant_nkey or m.get("from_key")==participant_nkey)]
-    th.sort(key=lambda x: x["timestamp"])
+@_store_txn
+def mark_completed(ev_name, name, at_venue):
+    s = load_store()
+    s["completions"].append({
+        "event": ev_name, "event_key": ekey(ev_name),
+        "name": name, "name_key": nkey(name),
+        "timestamp": datetime.now().isoformat(), "at_venue": bool(at_venue)
+    })
+    save_store(s)
+
+def get_thread(ev_key, participant_nkey, store=None):
+    msgs = (store or load_store())["messages"]
+    evk, pk = NAMES.lookup_key(ev_key), NAMES.lookup_key(participant_nkey)
+    th = [m for m in msgs if m.event_kid==evk and (m.to_kid==pk or m.from_kid==pk)]
+    th.sort(key=lambda x: x.timestamp)
     return th
 
 # ---------- Category extraction from brochure ----------
@@ -256,6 +356,7 @@ def admin_defined_subcategories(ev_key: str):
     s = load_store()
     return s.get("categories", {}).get(ev_key, [])
 
+@_store_txn
 def set_admin_subcategories(ev_key: str, items: list):
     s = load_store()
     s.setdefault("categories", {})
@@ -267,6 +368,7 @@ def load_draft(ev_key: str, subcat: str):
     evmap = s["drafts"].get(ev_key, {})
     return evmap.get(subcat or "", {"name":"","phone":"","email":"","grade":"","division":""})
 
+@_store_txn
 def save_draft(ev_key: str, subcat: str, name, phone, email, grade, division):
     s = load_store()
     s.setdefault("drafts", {})
@@ -303,12 +405,13 @@ else:
     cand = st.text_input("Participant full name (must already be saved)", key="participant_name").strip()
     phone = st.text_input("Your contact phone (optional, for call link)", key="participant_phone").strip()
     if cand:
-        nk = nkey(cand)
-        exists = any(p for p in load_store()["participants"] if p.get("name_key")==nk)
+        people = load_store()["participants"]
+        nk = NAMES.lookup_key(nkey(cand))
+        exists = any(p for p in people if p.name_kid==nk)
         if exists:
             authorized = True; current_user = cand
             upsert_session(cand, "participant", phone)
-            my_ev_keys = [p["event_key"] for p in load_store()["participants"] if p["name_key"]==nk]
+            my_ev_keys = [p.event_key for p in people if p.name_kid==nk]
             soon = None
             for ek in my_ev_keys:
                 ev = EVENTS_BY_KEY.get(ek); 
@@ -442,7 +545,7 @@ def render_event_card(ev: dict, scope: str, is_admin=False, participant_name: st
 
         if plist:
             st.write("**Inline edit participants**")
-            df = pd.DataFrame(plist)
+            df = pd.DataFrame([p.to_dict() for p in plist])
             view_cols = ["name","phone","email","grade","division","subcat"]
             df = df[view_cols]
             edited = st.data_editor(df, num_rows="dynamic", key=K("edit_participants"))
@@ -454,7 +557,7 @@ def render_event_card(ev: dict, scope: str, is_admin=False, participant_name: st
             st.download_button("⬇️ Export participants (CSV)", edited.to_csv(index=False).encode("utf-8"), file_name=f"{ekey(ev.get('name',''))}_participants.csv", mime="text/csv")
 
         if plist:
-            rm = st.selectbox("Remove participant (current category view)", ["--"]+[p["name"] for p in plist], key=K("rm"))
+            rm = st.selectbox("Remove participant (current category view)", ["--"]+[p.name for p in plist], key=K("rm"))
             if rm != "--":
                 remove_participant(ev.get("name",""), rm, sub_filter if (merged and sub_filter!="All") else "")
                 st.warning(f"Removed {rm}")
@@ -462,44 +565,50 @@ def render_event_card(ev: dict, scope: str, is_admin=False, participant_name: st
     else:
         st.info("Only admins can edit participants.")
 
-    # Roster & messaging per participant
+    # Roster & messaging per participant (one store load for all row summaries)
+    roster_store = load_store()
+    roster_cursors = load_cursors(admin_name) if (is_admin and admin_name) else {}
     for idx, p in enumerate(plist, start=1):
         c1, c2, c3, c4 = st.columns([2,2,1,3])
         with c1:
-            st.write(f"{idx}. **{p['name']}** — _{p.get('subcat') or '(no category)'}_")
-            st.caption(f"STD: {p.get('grade','')}  •  DIV: {p.get('division','')}")
+            st.write(f"{idx}. **{p.name}** — _{p.subcat or '(no category)'}_")
+            st.caption(f"STD: {p.grade}  •  DIV: {p.division}")
         with c2:
-            st.write(p.get("phone","")); st.caption(p.get("email",""))
+            st.write(p.phone); st.caption(p.email)
         with c3:
             if is_admin:
                 if st.button("Message", key=K(f"msgbtn_{idx}")):
                     st.session_state[K(f"open_thread_{idx}")] = True
-            if is_admin and p.get("phone"):
-                st.markdown(f"[📞 Call participant]({'tel:' + p['phone']})")
+            if is_admin and p.phone:
+                st.markdown(f"[📞 Call participant]({'tel:' + p.phone})")
         with c4:
-            thread = get_thread(ekey(ev.get("name","")), p["name_key"])
+            thread = get_thread(ekey(ev.get("name","")), p.name_key, roster_store)
             if thread:
                 last = thread[-1]
-                kind = last.get("kind","chat")
-                msg_icon = "📞" if kind=="call_request" else "💬"
-                st.caption(f"Last {msg_icon} {last['from']}: {last['text'][:60]}{'...' if len(last['text'])>60 else ''}")
+                msg_icon = "📞" if last.kind=="call_request" else "💬"
+                st.caption(f"Last {msg_icon} {last.from_}: {last.text[:60]}{'...' if len(last.text)>60 else ''}")
+                if is_admin and admin_name:
+                    n_unread = unread_count(roster_store, roster_cursors, ekey(ev.get("name","")), p.name_key)
+                    if n_unread: st.caption(f"🔵 {n_unread} unread")
 
         open_key = st.session_state.get(K(f"open_thread_{idx}"), False)
-        is_self = participant_name and nkey(participant_name)==p["name_key"]
+        is_self = participant_name and nkey(participant_name)==p.name_key
         if open_key or is_self:
-            with st.expander(f"Thread with {p['name']} — {ev.get('name','(Unnamed)')}", expanded=True if is_self else False):
-                thread = get_thread(ekey(ev.get("name","")), p["name_key"])
+            with st.expander(f"Thread with {p.name} — {ev.get('name','(Unnamed)')}", expanded=True if (is_self or open_key) else False):
+                thread = get_thread(ekey(ev.get("name","")), p.name_key)
                 if not thread:
                     st.caption("No messages yet.")
                 else:
                     for m in thread:
-                        dir_txt = (f"{m['from']} → You" if m["to_key"]==p["name_key"] else f"{m['from']} → Admins")
-                        icon = "📞" if m.get("kind")=="call_request" else "💬"
-                        st.markdown(f"{icon} **{m['timestamp']}** — {dir_txt}")
-                        if m.get("kind")=="call_request":
-                            want = m.get("meta",{}).get("direction","both")
+                        dir_txt = (f"{m.from_} → You" if m.to_kid==p.name_kid else f"{m.from_} → Admins")
+                        icon = "📞" if m.kind=="call_request" else "💬"
+                        st.markdown(f"{icon} **{m.timestamp}** — {dir_txt}")
+                        if m.kind=="call_request":
+                            want = m.meta.get("direction","both")
                             st.write(f"Call request: {want}")
-                        st.write(m["text"])
+                        st.write(m.text)
+                    if is_admin and admin_name and open_key:
+                        mark_thread_read(admin_name, ekey(ev.get("name","")), p.name_key, max(m.seq for m in thread))
 
                 if is_self:
                     msg = st.text_area("Your message to Admins", key=K(f"pmsg_{idx}"))
@@ -519,29 +628,24 @@ def render_event_card(ev: dict, scope: str, is_admin=False, participant_name: st
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.button("Send to participant", key=K(f"asend_{idx}")) and reply.strip():
-                            send_message(p["name"], admin_name, ev.get("name",""), reply.strip(), to_role="participant")
+                            send_message(p.name, admin_name, ev.get("name",""), reply.strip(), to_role="participant")
                             st.success("Sent.")
                             st.session_state[K(f"open_thread_{idx}")] = False
                     with col2:
                         if st.button("Mark call fulfilled", key=K(f"acall_{idx}")):
-                            send_message(p["name"], admin_name, ev.get("name",""), "Admin completed the call request.", to_role="participant", kind="system")
+                            send_message(p.name, admin_name, ev.get("name",""), "Admin completed the call request.", to_role="participant", kind="system")
 
     # Participant controls
     if participant_name:
-        my_rows = [p for p in event_participants(ev.get("name","")) if p["name_key"]==nkey(participant_name)]
+        my_rows = [p for p in event_participants(ev.get("name","")) if p.name_key==nkey(participant_name)]
         if my_rows:
             st.subheader("Your Event Control")
             now = datetime.now()
             if sdt and now >= sdt and (not edt or now <= edt + timedelta(hours=1)):
                 atv = st.checkbox("I am at the venue", key=K("venue"))
                 if st.button("Mark event completed", key=K("done")):
-                    s = load_store()
-                    s["completions"].append({
-                        "event": ev.get("name",""), "event_key": ekey(ev.get("name","")),
-                        "name": participant_name, "name_key": nkey(participant_name),
-                        "timestamp": datetime.now().isoformat(), "at_venue": bool(atv)
-                    })
-                    save_store(s); st.success("Marked completed.")
+                    mark_completed(ev.get("name",""), participant_name, atv)
+                    st.success("Marked completed.")
             else:
                 if sdt:
                     mins = int((sdt - now).total_seconds() // 60)
@@ -551,7 +655,7 @@ def render_event_card(ev: dict, scope: str, is_admin=False, participant_name: st
                 st.markdown(f"[📞 Call Admin]({'tel:' + admin_phone})")
 
 # ----- Tabs -----
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["🔎 Search", "🗓️ Timeline", "🧑‍🎓 Your Events", "✉️ Messages", "🟢 Online", "🗂️ Admin Data"])
+tab1, tab2, tab3, tab4, tab_inbox, tab5, tab6 = st.tabs(["🔎 Search", "🗓️ Timeline", "🧑‍🎓 Your Events", "✉️ Messages", "📥 Inbox", "🟢 Online", "🗂️ Admin Data"])
 
 with tab1:
     kind = st.radio("Search for", ["Events","Participants"], horizontal=True, key="search_kind")
@@ -580,8 +684,8 @@ with tab1:
     else:
         pq = st.text_input("Search participant name", key="search_participant_global").strip()
         s = load_store()
-        hits = [p for p in s["participants"] if norm(pq) in p["name_key"]] if pq else []
-        ev_keys = {p["event_key"] for p in hits}
+        hits = [p for p in s["participants"] if norm(pq) in p.name_key] if pq else []
+        ev_keys = {p.event_key for p in hits}
         res = [EVENTS_BY_KEY[k] for k in ev_keys if k in EVENTS_BY_KEY]
         st.write(f"Found {len(hits)} participant(s) in {len(res)} event(s).")
         for ev in res:
@@ -607,14 +711,14 @@ with tab2:
 with tab3:
     st.subheader("Your registered events")
     if mode == "Participant" and current_user:
-        nk = nkey(current_user)
         s = load_store()
-        my = [p for p in s["participants"] if p["name_key"]==nk]
+        nk = NAMES.lookup_key(nkey(current_user))
+        my = [p for p in s["participants"] if p.name_kid==nk]
         if not my:
             st.info("You have not been added to any event by Admin yet.")
         else:
             for row in my:
-                ev = EVENTS_BY_KEY.get(row["event_key"])
+                ev = EVENTS_BY_KEY.get(row.event_key)
                 if not ev: continue
                 with st.container():
                     render_event_card(ev, scope="mine", is_admin=False, participant_name=current_user, admin_name=admin_name, admin_phone=admin_phone)
@@ -624,18 +728,42 @@ with tab3:
 with tab4:
     st.subheader("✉️ Messages (All)")
     s = load_store()
-    msgs = sorted(s.get("messages",[]), key=lambda m: m["timestamp"])
+    msgs = sorted(s.get("messages",[]), key=lambda m: m.timestamp)
     if st.toggle("Live mode (5s auto-refresh)", key="live_msg"):
         live_autorefresh(True, 5000, 'messages_live')
     for m in msgs[-250:]:
-        icon = "📞" if m.get("kind")=="call_request" else "💬"
-        st.markdown(f"{icon} **{m['timestamp']}** — _{m['event']}_ — **{m['from']}** → **{m['to']}**: {m['text']}")
+        icon = "📞" if m.kind=="call_request" else "💬"
+        st.markdown(f"{icon} **{m.timestamp}** — _{m.event}_ — **{m.from_}** → **{m.to}**: {m.text}")
+
+with tab_inbox:
+    st.subheader("📥 Admin Inbox — unread & open call requests")
+    if is_admin and admin_name:
+        pick_ev = st.selectbox("Filter by event", ["All"] + [ev.get("name","") for ev in EVENTS], key="inbox_event")
+        rows = admin_inbox(load_store(), load_cursors(admin_name), None if pick_ev=="All" else ekey(pick_ev))
+        st.caption(f"{len(rows)} thread(s) waiting, oldest first. Unread state is tracked per admin.")
+        for i, r in enumerate(rows):
+            c1, c2, c3 = st.columns([3,4,1])
+            with c1:
+                st.write(f"**{r['participant']}** — _{r['event']}_")
+                st.caption(f"Waiting since {r['waiting_since']}")
+            with c2:
+                badges = []
+                if r["unread"]: badges.append(f"🔵 {r['unread']} unread")
+                if r["open_calls"]: badges.append(f"📞 {r['open_calls']} open call request(s)")
+                st.write("  •  ".join(badges))
+                st.caption(r["last"])
+            with c3:
+                if r["unread"] and st.button("Mark read", key=f"inbox_read_{i}_{r['thread']}"):
+                    mark_thread_read(admin_name, r["event_key"], r["participant_key"], r["last_seq"])
+                    st.rerun()
+    else:
+        st.info("Admins only.")
 
 with tab5:
     st.subheader("🟢 Online (last seen)")
     s = load_store()
-    ses = sorted(s.get("sessions",[]), key=lambda r: r.get("last_seen",""), reverse=True)
-    df = pd.DataFrame([{"name":r["name"], "role": r.get("role",""), "phone": r.get("phone",""), "last_seen": r.get("last_seen","")} for r in ses])
+    ses = sorted(s.get("sessions",[]), key=lambda r: r.last_seen, reverse=True)
+    df = pd.DataFrame([{"name": r.name, "role": r.role, "phone": r.phone, "last_seen": r.last_seen} for r in ses])
     st.dataframe(df, use_container_width=True)
 
 def export_master_csv():
@@ -655,21 +783,21 @@ def export_master_csv():
     s = load_store()
     rows = []
     for p in s.get("participants", []):
-        ev = EVENTS_BY_KEY.get(p.get("event_key",""))
+        ev = EVENTS_BY_KEY.get(p.event_key)
         if not ev: 
-            evname = p.get("event","")
+            evname = p.event
             teacher = ""
             dates = ""
         else:
             evname = ev.get("name","")
             teacher = ev.get("teacher_in_charge","")
             dates = (ev.get("date") or ev.get("date_info_duty","") or "").strip()
-        name = p.get("name","")
-        email = p.get("email","")
-        phone = p.get("phone","")
-        std = p.get("grade","")
-        div = p.get("division","")
-        cat = p.get("subcat","")
+        name = p.name
+        email = p.email
+        phone = p.phone
+        std = p.grade
+        div = p.division
+        cat = p.subcat
         rows.append([evname, teacher, name, email, phone, std, div, dates, cat])
 
     df = pd.DataFrame(rows, columns=headers)
@@ -691,7 +819,7 @@ with tab6:
                            file_name="ADMIN_MASTER_PARTICIPANTS.csv", mime="text/csv")
         st.caption(f"Also saved server-side at: {out_path.name}")
 
-        st.download_button("⬇️ Download data JSON", json.dumps(s, ensure_ascii=False, indent=2).encode("utf-8"),
+        st.download_button("⬇️ Download data JSON", json.dumps(dump_records(s), ensure_ascii=False, indent=2).encode("utf-8"),
                            file_name="participants_store_export.json", mime="application/json")
     else:
         st.info("Admins only.")
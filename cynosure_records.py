@@ -0,0 +1,351 @@
+"""Compact in-memory records for the Cynosure portal store.
+
+Participants, messages and sessions are slotted objects instead of dicts. Event and
+person names are interned once per process in NAMES as small integer IDs, each linked
+to the ID of its normalized key, so records never carry their own *_key strings.
+Dicts are only built at the UI/export boundary via to_dict(); the JSON on disk keeps
+its original layout, and is written by streaming each record's JSON straight to the
+file. StoreFile keeps one such store per process and re-reads the file only when it
+changes.
+"""
+import gc, json, os, re, sys, tempfile, threading
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from json.encoder import encode_basestring as _enc
+
+_ENC = json.JSONEncoder(ensure_ascii=False)
+
+def norm(s: str) -> str:
+    if not s: return ""
+    s = s.strip().lower()
+    s = re.sub(r"\s+", " ", s)
+    return s
+
+def _i(s) -> str:
+    """Interns short repeated values (roles, kinds, grades, categories)."""
+    return sys.intern(s) if isinstance(s, str) else ("" if s is None else str(s))
+
+class KeyTable:
+    """Display name <-> small int ID, with each name mapped to the int ID of norm(name).
+
+    Shared by every session thread; lookups are lock-free, new names are added under a lock.
+    Each name and key also keeps its JSON-encoded form, so saving never re-encodes them.
+    The table only grows: IDs stay valid for records any session still holds, and it is
+    bounded by the distinct event/person names the process has seen (a few thousand for a
+    school fest, tens of bytes each), so names of removed participants are simply kept.
+    """
+    __slots__ = ("_ids", "_text", "_jtext", "_key_of", "_key_ids", "_keys", "_jkeys", "_lock")
+
+    def __init__(self):
+        self._ids, self._text, self._jtext, self._key_of = {}, [], [], array("i")
+        self._key_ids, self._keys, self._jkeys = {}, [], []
+        self._lock = threading.Lock()
+
+    def intern(self, name) -> int:
+        name = name or ""
+        i = self._ids.get(name)
+        if i is not None: return i
+        k = norm(name)
+        with self._lock:
+            i = self._ids.get(name)
+            if i is None:
+                kid = self._key_ids.get(k)
+                if kid is None:
+                    self._keys.append(k); self._jkeys.append(_enc(k))
+                    kid = self._key_ids[k] = len(self._keys) - 1
+                self._text.append(name); self._jtext.append(_enc(name)); self._key_of.append(kid)
+                i = self._ids[name] = len(self._text) - 1
+        return i
+
+    def text(self, i: int) -> str: return self._text[i]
+    def key(self, i: int) -> str: return self._keys[self._key_of[i]]
+    def key_id(self, i: int) -> int: return self._key_of[i]
+    def json_text(self, i: int) -> str: return self._jtext[i]
+    def json_key(self, i: int) -> str: return self._jkeys[self._key_of[i]]
+
+    def lookup_key(self, key: str) -> int:
+        """ID of an already-normalized key, or -1 if no record uses it (matches nothing)."""
+        return self._key_ids.get(key, -1)
+
+NAMES = KeyTable()
+
+def _name_props(prefix):
+    attr = prefix + "_id"
+    return (property(lambda self: NAMES.text(getattr(self, attr))),
+            property(lambda self: NAMES.key(getattr(self, attr))),
+            property(lambda self: NAMES.key_id(getattr(self, attr))))
+
+def _str(s) -> str:
+    return s if isinstance(s, str) else ("" if s is None else str(s))
+
+class Participant:
+    __slots__ = ("event_id", "name_id", "phone", "email", "grade", "division", "subcat")
+
+    def __init__(self, event, name, phone="", email="", grade="", division="", subcat=""):
+        self.event_id = NAMES.intern(event); self.name_id = NAMES.intern(name)
+        self.phone = phone or ""; self.email = email or ""
+        self.grade = _i(grade); self.division = _i(division); self.subcat = _i(subcat)
+
+    event, event_key, event_kid = _name_props("event")
+    name, name_key, name_kid = _name_props("name")
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get("event",""), d.get("name",""), d.get("phone",""), d.get("email",""),
+                   d.get("grade",""), d.get("division",""), d.get("subcat",""))
+
+    @staticmethod
+    def from_dicts(rows):
+        """Bulk from_dict for load_records: no per-record __init__ or property calls."""
+        ids, intern, si, new = NAMES._ids, NAMES.intern, sys.intern, Participant.__new__
+        for i, d in enumerate(rows):
+            p = new(Participant); g = d.get
+            ev, nm = g("event") or "", g("name") or ""
+            p.event_id = ids[ev] if ev in ids else intern(ev)
+            p.name_id = ids[nm] if nm in ids else intern(nm)
+            p.phone = _str(g("phone")); p.email = _str(g("email"))
+            p.grade = si(_str(g("grade"))); p.division = si(_str(g("division"))); p.subcat = si(_str(g("subcat")))
+            rows[i] = p
+
+    def to_dict(self):
+        return {"event": self.event, "event_key": self.event_key, "name": self.name, "name_key": self.name_key,
+                "phone": self.phone, "email": self.email, "grade": self.grade,
+                "division": self.division, "subcat": self.subcat}
+
+    def to_json(self):
+        t, k = NAMES.json_text, NAMES.json_key
+        return (f'{{"event": {t(self.event_id)}, "event_key": {k(self.event_id)}, '
+                f'"name": {t(self.name_id)}, "name_key": {k(self.name_id)}, "phone": {_enc(self.phone)}, '
+                f'"email": {_enc(self.email)}, "grade": {_enc(self.grade)}, "division": {_enc(self.division)}, '
+                f'"subcat": {_enc(self.subcat)}}}')
+
+class Message:
+    __slots__ = ("seq", "to_id", "from_id", "event_id", "to_role", "text", "timestamp", "kind", "_meta")
+
+    def __init__(self, to, frm, event, to_role, text, timestamp, kind="chat", meta=None, seq=0):
+        self.to_id = NAMES.intern(to); self.from_id = NAMES.intern(frm); self.event_id = NAMES.intern(event)
+        self.to_role = _i(to_role); self.text = text; self.timestamp = timestamp
+        self.kind = _i(kind or "chat"); self._meta = meta or None; self.seq = seq
+
+    to, to_key, to_kid = _name_props("to")
+    from_, from_key, from_kid = _name_props("from")
+    event, event_key, event_kid = _name_props("event")
+
+    @property
+    def meta(self): return self._meta or {}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get("to",""), d.get("from",""), d.get("event",""), d.get("to_role",""), d.get("text",""),
+                   d.get("timestamp",""), d.get("kind","chat"), d.get("meta"), d.get("seq", 0))
+
+    @staticmethod
+    def from_dicts(rows):
+        """Bulk from_dict for load_records: no per-record __init__ or property calls."""
+        ids, intern, si, new = NAMES._ids, NAMES.intern, sys.intern, Message.__new__
+        for i, d in enumerate(rows):
+            m = new(Message); g = d.get
+            to, frm, ev = g("to") or "", g("from") or "", g("event") or ""
+            m.to_id = ids[to] if to in ids else intern(to)
+            m.from_id = ids[frm] if frm in ids else intern(frm)
+            m.event_id = ids[ev] if ev in ids else intern(ev)
+            m.to_role = si(_str(g("to_role"))); m.text = _str(g("text")); m.timestamp = _str(g("timestamp"))
+            m.kind = si(g("kind") or "chat"); m._meta = g("meta") or None; m.seq = g("seq") or 0
+            rows[i] = m
+
+    def to_dict(self):
+        return {"to": self.to, "to_key": self.to_key, "from": self.from_, "from_key": self.from_key,
+                "event": self.event, "event_key": self.event_key, "to_role": self.to_role,
+                "text": self.text, "timestamp": self.timestamp, "kind": self.kind,
+                "meta": self.meta, "seq": self.seq}
+
+    def to_json(self):
+        t, k = NAMES.json_text, NAMES.json_key
+        return (f'{{"to": {t(self.to_id)}, "to_key": {k(self.to_id)}, "from": {t(self.from_id)}, '
+                f'"from_key": {k(self.from_id)}, "event": {t(self.event_id)}, "event_key": {k(self.event_id)}, '
+                f'"to_role": {_enc(self.to_role)}, "text": {_enc(self.text)}, "timestamp": {_enc(self.timestamp)}, '
+                f'"kind": {_enc(self.kind)}, "meta": {_ENC.encode(self._meta) if self._meta else "{}"}, '
+                f'"seq": {int(self.seq)}}}')
+
+class Session:
+    __slots__ = ("name_id", "role", "last_seen", "phone")
+
+    def __init__(self, name, role, last_seen, phone=""):
+        self.name_id = NAMES.intern(name); self.role = _i(role); self.last_seen = last_seen; self.phone = phone or ""
+
+    name, name_key, name_kid = _name_props("name")
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get("name",""), d.get("role",""), d.get("last_seen",""), d.get("phone",""))
+
+    @staticmethod
+    def from_dicts(rows):
+        for i, d in enumerate(rows):
+            rows[i] = Session.from_dict(d)
+
+    def to_dict(self):
+        return {"name": self.name, "name_key": self.name_key, "role": self.role,
+                "last_seen": self.last_seen, "phone": self.phone}
+
+    def to_json(self):
+        return (f'{{"name": {NAMES.json_text(self.name_id)}, "name_key": {NAMES.json_key(self.name_id)}, '
+                f'"role": {_enc(self.role)}, "last_seen": {_enc(self.last_seen)}, "phone": {_enc(self.phone)}}}')
+
+RECORD_TYPES = {"participants": Participant, "messages": Message, "sessions": Session}
+
+def load_records(raw: dict) -> dict:
+    """Converts the record lists of a freshly parsed store to compact records, in place.
+
+    Each dict is dropped as soon as its record exists, so peak memory stays close to the
+    parsed JSON instead of holding both layouts at once.
+    """
+    for field, cls in RECORD_TYPES.items():
+        cls.from_dicts(raw.setdefault(field, []))
+    return raw
+
+def dump_records(store: dict) -> dict:
+    """Plain-dict copy of the store for the JSON export download (saving streams instead)."""
+    out = dict(store)
+    for field in RECORD_TYPES:
+        out[field] = [r.to_dict() for r in store.get(field, [])]
+    return out
+
+def _stamp(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _write_temp(path, chunks):
+    """Writes the text chunks to a temp file next to `path`; returns (temp path, stamp)."""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.writelines(chunks)
+            f.flush()
+            st = os.fstat(f.fileno())
+        os.chmod(tmp, 0o644)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp, _stamp(st)
+
+def _replace(tmp, path):
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def write_json_atomic(path, chunks):
+    """Writes the text chunks to a temp file next to `path`, then renames it into place.
+
+    Returns the (inode, mtime, size) stamp of the written file, taken from the temp file
+    itself so a concurrent writer can never be mistaken for this one.
+    """
+    tmp, stamp = _write_temp(path, chunks)
+    _replace(tmp, path)
+    return stamp
+
+def _store_chunks(snapshot):
+    yield "{"
+    for n, (field, value) in enumerate(snapshot):
+        yield ("," if n else "") + "\n  " + _enc(field) + ": "
+        if isinstance(value, str):
+            yield value
+        elif not value:
+            yield "[]"
+        else:
+            yield "["
+            for j, r in enumerate(value):
+                yield (",\n    " if j else "\n    ") + r.to_json()
+            yield "\n  ]"
+    yield "\n}\n"
+
+class StoreFile:
+    """One compact store per process for a JSON store file.
+
+    load() returns the cached store without locking while the file's (inode, mtime, size)
+    stamp is unchanged; only a re-read takes `lock`. Callers mutate the returned store in
+    place and call save(), wrapping load-modify-save sequences in transaction() so that
+    sessions never snapshot the store mid-update. save() snapshots under the lock and
+    streams the file to a temp file outside it (after the transaction ends); only the
+    rename takes the lock again. Writes of older snapshots are skipped once a newer one
+    is on disk. prepare(store) fills defaults after a read and returns True when the
+    file should be rewritten (e.g. a rebuilt index).
+    """
+
+    def __init__(self, path, default: dict, prepare=None):
+        self.path, self.default, self.prepare = path, default, prepare
+        self.lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._cache = (None, None)  # (store, stamp), swapped as one tuple for lock-free reads
+        self._gen = self._written_gen = 0
+
+    def _stat(self):
+        try:
+            return _stamp(os.stat(self.path))
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> dict:
+        store, stamp = self._cache
+        if store is not None and stamp == self._stat():
+            return store
+        rewrite = False
+        with self.lock:
+            if self._stat() is None:
+                write_json_atomic(self.path, [json.dumps(self.default, ensure_ascii=False)])
+            stamp = self._stat()
+            store, cached_stamp = self._cache
+            if store is None or stamp != cached_stamp:
+                # Parsing and converting allocates only acyclic objects; pausing the cyclic GC
+                # avoids repeated full passes over the growing heap.
+                gc_was_enabled = gc.isenabled(); gc.disable()
+                try:
+                    try:
+                        raw = json.loads(self.path.read_text(encoding="utf-8"))
+                    except Exception:
+                        raw = json.loads(json.dumps(self.default))
+                    store = load_records(raw)
+                finally:
+                    if gc_was_enabled: gc.enable()
+                rewrite = bool(self.prepare and self.prepare(store))
+                self._cache = (store, stamp)
+        if rewrite: self.save(store)
+        return store
+
+    @contextmanager
+    def transaction(self):
+        """Holds the lock for a load-modify-save; the save itself is written after release."""
+        local = self._local
+        with self.lock:
+            local.depth = getattr(local, "depth", 0) + 1
+            try:
+                yield
+            finally:
+                local.depth -= 1
+                pending = getattr(local, "pending", None) if local.depth==0 else None
+                if pending: local.pending = None
+        if pending: self._write(*pending)
+
+    def save(self, store: dict):
+        with self.lock:
+            store["updated_at"] = datetime.now().isoformat()
+            self._gen += 1
+            snapshot = [(k, list(v) if k in RECORD_TYPES else _ENC.encode(v)) for k, v in store.items()]
+            pending = (self._gen, store, snapshot)
+            if getattr(self._local, "depth", 0):
+                self._local.pending = pending; return
+        self._write(*pending)
+
+    def _write(self, gen, store, snapshot):
+        with self._write_lock:
+            if gen <= self._written_gen: return
+            tmp, stamp = _write_temp(self.path, _store_chunks(snapshot))
+            # Rename and record the stamp together, so load() never mistakes this write
+            # for a foreign one and re-reads over snapshots still waiting to be written.
+            with self.lock:
+                _replace(tmp, self.path)
+                if self._cache[0] is store: self._cache = (store, stamp)
+            self._written_gen = gen